@@ -2,6 +2,32 @@ import subprocess
 import json
 import os
 import re
+from functools import lru_cache
+
+from yt_dlp_runner import iter_yt_dlp_output
+
+# orjson is optional; it parses yt-dlp's JSON lines considerably faster than the
+# stdlib and raises a subclass of json.JSONDecodeError on bad input.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Patterns used by clean_title_for_comparison, compiled once at import time.
+# File extensions and bitrate suffixes (from local filenames) are removed outright.
+_FILENAME_SUFFIX_RE = re.compile(
+    r"\.(mp3|m4a|opus)$|\s*\((mp3|m4a|mp4)_\d+k\)\s*", re.IGNORECASE
+)
+# Common YouTube/Snaptube descriptive suffixes (often in parentheses or brackets)
+# and any non-alphanumeric characters (excluding spaces and hyphens) become a space.
+# The character class is kept case-sensitive: under IGNORECASE, Unicode case folding
+# would let letters such as "ı" and "ſ" count as "i" and "s" and survive cleaning.
+_DESCRIPTIVE_OR_PUNCTUATION_RE = re.compile(
+    r"\s*(\(|\[)(official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie)(\)|\])\s*"
+    r"|(?-i:[^a-z0-9\s-])",
+    re.IGNORECASE | re.UNICODE,
+)
+_SEPARATORS_RE = re.compile(r"[\s-]+")
 
 
 def get_youtube_playlist_titles(playlist_url):
@@ -18,15 +44,13 @@ def get_youtube_playlist_titles(playlist_url):
     print(f"Fetching YouTube playlist titles from: {playlist_url}")
     try:
         command = ["yt-dlp", "--flat-playlist", "--print-json", playlist_url]
-        process = subprocess.run(
-            command, capture_output=True, text=True, check=True, encoding="utf-8"
-        )
-
         youtube_titles = []
-        for line in process.stdout.strip().split("\n"):
+        # Parse each JSON line as yt-dlp emits it instead of buffering the whole output
+        for line in iter_yt_dlp_output(command):
+            line = line.strip()
             if line:
                 try:
-                    video_data = json.loads(line)
+                    video_data = json_loads(line)
                     title = video_data.get("title")
                     if title:
                         youtube_titles.append(title)
@@ -52,40 +76,26 @@ def get_youtube_playlist_titles(playlist_url):
         return []
 
 
+@lru_cache(maxsize=None)
 def clean_title_for_comparison(title_string):
     """
     Cleans and normalizes a song title (from YouTube or local filename) for robust comparison.
     This function aims to extract the core artist and song title, stripping away
     suffixes, bitrate info, and standardizing special characters.
+    Results are memoized, so duplicate titles and filenames are only cleaned once.
     """
     cleaned = title_string.lower()
 
-    # 1. Remove common file extensions (if present, from local filenames)
-    cleaned = re.sub(r"\.(mp3|m4a|opus)$", "", cleaned, flags=re.IGNORECASE)
-
-    # 2. Remove common bitrate suffixes (from local filenames)
-    cleaned = re.sub(r"\s*\(mp3_\d+k\)\s*", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"\s*\(m4a_\d+k\)\s*", "", cleaned, flags=re.IGNORECASE)
-    cleaned = re.sub(r"\s*\(mp4_\d+k\)\s*", "", cleaned, flags=re.IGNORECASE)
-
-    # 3. Remove common YouTube/Snaptube descriptive suffixes (from both)
-    # This regex targets common phrases often in parentheses or brackets.
-    cleaned = re.sub(
-        r"\s*(\(|\[)(official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie)(\)|\])\s*",
-        " ",  # Replace with space to separate words
-        cleaned,
-        flags=re.IGNORECASE | re.UNICODE,
-    )
+    # 1. Remove common file extensions and bitrate suffixes (from local filenames)
+    cleaned = _FILENAME_SUFFIX_RE.sub("", cleaned)
 
-    # 4. Replace non-alphanumeric characters (excluding spaces and hyphens) with a space.
-    # This handles all forms of punctuation and Musicolet's `_` replacements.
-    cleaned = re.sub(r"[^a-z0-9\s-]", " ", cleaned)
+    # 2. Replace descriptive suffixes (from both) and non-alphanumeric characters
+    # with a space. This handles all forms of punctuation and Musicolet's `_`
+    # replacements. Suffixes are tried first, so they are removed as whole phrases.
+    cleaned = _DESCRIPTIVE_OR_PUNCTUATION_RE.sub(" ", cleaned)
 
-    # 5. Collapse multiple spaces/hyphens into a single space.
-    cleaned = re.sub(r"[\s-]+", " ", cleaned)
-
-    # 6. Trim leading/trailing spaces.
-    cleaned = cleaned.strip()
+    # 3. Collapse multiple spaces/hyphens into a single space and trim the ends.
+    cleaned = _SEPARATORS_RE.sub(" ", cleaned).strip()
 
     return cleaned
 
@@ -103,7 +113,7 @@ def parse_musicolet_m3u_to_cleaned_titles(m3u_file_path):
     local_cleaned_titles = set()
     print(f"Parsing local library M3U file: {m3u_file_path}")
     try:
-        with open(m3u_file_path, "r", encoding="utf-8") as f:
+        with open(m3u_file_path, "r", encoding="utf-8", buffering=1 << 16) as f:
             for line in f:
                 line = line.strip()
                 if not line or line.startswith("#"):
@@ -159,10 +169,10 @@ if __name__ == "__main__":
         print("No YouTube videos found or error occurred. Cannot proceed.")
         exit()
 
-    # Clean and normalize YouTube titles for comparison
-    youtube_cleaned_titles = {
+    # Clean and normalize YouTube titles for comparison (once, in playlist order)
+    youtube_cleaned_titles = [
         clean_title_for_comparison(title) for title in youtube_titles_raw
-    }
+    ]
 
     # Get local cleaned titles from Musicolet's M3U
     local_library_cleaned_titles = parse_musicolet_m3u_to_cleaned_titles(
@@ -179,9 +189,9 @@ if __name__ == "__main__":
     matched_count = 0
 
     print("\nComparing YouTube playlist with local library...")
-    for i, yt_title_raw in enumerate(youtube_titles_raw):
-        cleaned_yt_title = clean_title_for_comparison(yt_title_raw)
-
+    for yt_title_raw, cleaned_yt_title in zip(
+        youtube_titles_raw, youtube_cleaned_titles
+    ):
         if cleaned_yt_title in local_library_cleaned_titles:
             matched_count += 1
         else:
@@ -200,8 +210,7 @@ if __name__ == "__main__":
         output_missing_file = "missing_youtube_songs.txt"
         try:
             with open(output_missing_file, "w", encoding="utf-8") as f:
-                for song in missing_songs_raw:
-                    f.write(song + "\n")
+                f.write("".join(song + "\n" for song in missing_songs_raw))
             print(f"\nList of missing songs saved to '{output_missing_file}'")
         except IOError as e:
             print(f"Error saving missing songs list: {e}")
@@ -2,8 +2,28 @@
 
 import subprocess
 import json
-import os
 import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from yt_dlp_runner import iter_yt_dlp_output
+
+# orjson is optional; it parses yt-dlp's JSON lines considerably faster than the
+# stdlib and raises a subclass of json.JSONDecodeError on bad input.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Patterns used by normalize_text_for_comparison, compiled once at import time.
+_SUFFIX_RE = re.compile(
+    r"\s*(\(|\[)(official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie|mp3_\d+k|m4a_\d+k|mp4_\d+k)(\)|\])\s*",
+    re.IGNORECASE | re.UNICODE,
+)
+# Punctuation is mapped to spaces with str.translate, which needs no regex engine.
+_PUNCTUATION_TABLE = str.maketrans(
+    dict.fromkeys(".,!?;:'\"“”‘’`~@#$%^&*()_+={}[]\\|<>/", " ")
+)
 
 
 def get_youtube_playlist_info(playlist_url):
@@ -20,15 +40,13 @@ def get_youtube_playlist_info(playlist_url):
     print(f"Fetching playlist information from: {playlist_url}")
     try:
         command = ["yt-dlp", "--flat-playlist", "--print-json", playlist_url]
-        process = subprocess.run(
-            command, capture_output=True, text=True, check=True, encoding="utf-8"
-        )
-
         youtube_titles = []
-        for line in process.stdout.strip().split("\n"):
+        # Parse each JSON line as yt-dlp emits it instead of buffering the whole output
+        for line in iter_yt_dlp_output(command):
+            line = line.strip()
             if line:
                 try:
-                    video_data = json.loads(line)
+                    video_data = json_loads(line)
                     title = video_data.get("title")
                     if title:
                         youtube_titles.append(title)
@@ -54,26 +72,22 @@ def get_youtube_playlist_info(playlist_url):
         return []
 
 
+@lru_cache(maxsize=None)
 def normalize_text_for_comparison(text):
     """
     Normalizes a string for robust comparison by:
     - Lowercasing
     - Removing common suffixes like (Official Video), (MP3_160K), etc.
     - Removing common punctuation and extra spaces.
+    Results are memoized, so duplicate titles and filenames are only normalized once.
     """
     normalized = text.lower()
 
     # Remove common YouTube/Snaptube suffixes and bitrate info
-    normalized = re.sub(
-        r"\s*(\(|\[)(official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie|mp3_\d+k|m4a_\d+k|mp4_\d+k)(\)|\])\s*",
-        "",
-        normalized,
-        flags=re.IGNORECASE | re.UNICODE,
-    )
+    normalized = _SUFFIX_RE.sub("", normalized)
 
     # Remove common punctuation and replace with space, then reduce multiple spaces
-    normalized = re.sub(r'[.,!?;:\'"“”‘’`~@#$%^&*()_+={}\[\]\\|<>/]', " ", normalized)
-    normalized = re.sub(r"\s+", " ", normalized)
+    normalized = " ".join(normalized.translate(_PUNCTUATION_TABLE).split())
 
     # Remove leading/trailing spaces and hyphens
     normalized = normalized.strip(" -")
@@ -81,45 +95,38 @@ def normalize_text_for_comparison(text):
     return normalized
 
 
-def parse_musicolet_m3u_for_filenames(m3u_file_path):
+def iter_musicolet_m3u_filenames(m3u_file_path):
     """
-    Parses a Musicolet-exported M3U file to extract and normalize filenames.
+    Parses a Musicolet-exported M3U file and yields normalized filenames as they are
+    read, so the caller can index the library without an intermediate collection.
 
     Args:
         m3u_file_path (str): Path to the Musicolet-exported M3U file.
 
-    Returns:
-        set: A set of normalized filenames found in the local library.
+    Yields:
+        str: The normalized filename of each song in the local library, duplicates
+             included.
+
+    Raises:
+        OSError, UnicodeDecodeError: If the file can't be read. Errors are raised
+            rather than reported here, since they can happen after part of the
+            library has already been yielded.
     """
-    local_filenames_normalized = set()
     print(f"Parsing local library M3U file: {m3u_file_path}")
-    try:
-        with open(m3u_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue  # Skip empty lines and EXTINF/comment lines
-
-                # Extract filename from the path
-                # Example path: snaptube/download/SnapTube Audio/Lil Yachty - Won_t Diss You(MP3_160K).mp3
-                filename_with_ext = os.path.basename(line)
-
-                # Normalize the filename for comparison
-                normalized_filename = normalize_text_for_comparison(filename_with_ext)
-                if normalized_filename:
-                    local_filenames_normalized.add(normalized_filename)
-        print(
-            f"Extracted and normalized {len(local_filenames_normalized)} unique local filenames."
-        )
-        return local_filenames_normalized
-    except FileNotFoundError:
-        print(
-            f"Error: Musicolet M3U file not found at '{m3u_file_path}'. Please check the path."
-        )
-        return set()
-    except Exception as e:
-        print(f"An unexpected error occurred while parsing local M3U: {e}")
-        return set()
+    with open(m3u_file_path, "r", encoding="utf-8", buffering=1 << 16) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue  # Skip empty lines and EXTINF/comment lines
+            # Extract filename from the path; Windows exports may use "\" separators
+            # Extract filename from the path, accepting both "/" and "\\" separators
+            # Example path: snaptube/download/SnapTube Audio/Lil Yachty - Won_t Diss You(MP3_160K).mp3
+            filename_with_ext = line.replace("\\", "/").rpartition("/")[2]
+
+            # Normalize the filename for comparison
+            normalized_filename = normalize_text_for_comparison(filename_with_ext)
+            if normalized_filename:
+                yield normalized_filename
 
 
 if __name__ == "__main__":
@@ -149,15 +156,37 @@ if __name__ == "__main__":
         print("No YouTube videos found or error occurred. Cannot proceed.")
         exit()
 
-    # Get local filenames from Musicolet's M3U
-    local_library_normalized_filenames = parse_musicolet_m3u_for_filenames(
-        musicolet_m3u_path
-    )
+    # Get local filenames from Musicolet's M3U, building the set used for exact
+    # matches and the inverted index used for the lenient check as they are read.
+    # The index maps each word to the ids of the local filenames containing it,
+    # so a title only visits filenames it shares words with.
+    local_library_normalized_filenames = set()
+    word_to_filename_ids = defaultdict(list)
+    try:
+        for normalized_filename in iter_musicolet_m3u_filenames(musicolet_m3u_path):
+            if normalized_filename in local_library_normalized_filenames:
+                continue
+            filename_id = len(local_library_normalized_filenames)
+            local_library_normalized_filenames.add(normalized_filename)
+            for word in set(normalized_filename.split()):
+                word_to_filename_ids[word].append(filename_id)
+    except FileNotFoundError:
+        print(
+            f"Error: Musicolet M3U file not found at '{musicolet_m3u_path}'. Please check the path."
+        )
+        local_library_normalized_filenames.clear()
+    except Exception as e:
+        print(f"An unexpected error occurred while parsing local M3U: {e}")
+        # A partially read library would report songs that are present as missing
+        local_library_normalized_filenames.clear()
     if not local_library_normalized_filenames:
         print(
             "No local songs found in the provided M3U file or error occurred. Cannot proceed."
         )
         exit()
+    print(
+        f"Extracted and normalized {len(local_library_normalized_filenames)} unique local filenames."
+    )
 
     # Compare and find missing songs
     missing_songs = []
@@ -175,15 +204,13 @@ if __name__ == "__main__":
             found_lenient = False
             yt_words = set(normalized_yt_title.split())
             if yt_words:  # Only proceed if there are words to compare
-                for local_norm_filename in local_library_normalized_filenames:
-                    local_words = set(local_norm_filename.split())
-                    if (
-                        local_words
-                        and len(yt_words.intersection(local_words)) / len(yt_words)
-                        >= 0.7
-                    ):  # 70% word overlap
-                        found_lenient = True
-                        break
+                # Count the words each local filename shares with this title
+                shared_word_counts = Counter()
+                for word in yt_words:
+                    shared_word_counts.update(word_to_filename_ids.get(word, ()))
+                best_shared = max(shared_word_counts.values(), default=0)
+                if best_shared / len(yt_words) >= 0.7:  # 70% word overlap
+                    found_lenient = True
 
             if not found_lenient:
                 missing_songs.append(yt_title)
@@ -201,8 +228,7 @@ if __name__ == "__main__":
         output_missing_file = "missing_youtube_songs.txt"
         try:
             with open(output_missing_file, "w", encoding="utf-8") as f:
-                for song in missing_songs:
-                    f.write(song + "\n")
+                f.write("".join(song + "\n" for song in missing_songs))
             print(f"\nList of missing songs saved to '{output_missing_file}'")
         except IOError as e:
             print(f"Error saving missing songs list: {e}")
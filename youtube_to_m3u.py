@@ -1,39 +1,164 @@
+import argparse
+import hashlib
 import subprocess
 import json
 import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
+from yt_dlp_runner import iter_yt_dlp_output
 
-def get_youtube_playlist_info(playlist_url):
+# orjson is optional; it parses yt-dlp's JSON lines considerably faster than the
+# stdlib and raises a subclass of json.JSONDecodeError on bad input.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Patterns used by the title helpers below, compiled once at import time.
+# Runs of invalid characters and underscores collapse into a single underscore.
+_INVALID_FILENAME_CHARS_RE = re.compile(r'[\\/:*?"<>|\',&_]+')
+# Descriptive suffixes and bitrate suffixes removed from display titles.
+_DISPLAY_SUFFIX_RE = re.compile(
+    r"\s*((\(|\[)(official\s+)?(video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie)(\)|\])|\(mp3_\d+k\))\s*",
+    re.IGNORECASE | re.UNICODE,
+)
+# Snaptube appends the download format to the title, e.g. "Title(MP3_160K).mp3".
+_FORMAT_SUFFIX_RE = re.compile(r"\((mp3|m4a|mp4)_\d+k\)$", re.IGNORECASE)
+
+# Base path for your Snaptube downloads, RELATIVE to /storage/emulated/0/
+# This is based on Musicolet's exported paths. It must end with "/", since
+# filenames are appended to it directly.
+RELATIVE_ANDROID_BASE_PATH = "snaptube/download/SnapTube Audio/"
+
+# Audio formats picked up by the local folder scan, most preferred first. MP3 comes
+# first since it is what the generated paths assume when no file is found.
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".aac", ".opus", ".ogg", ".flac", ".wav")
+
+# Playlist information is cached per URL so re-runs can skip yt-dlp entirely.
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "yt2m3u")
+CACHE_TTL_SECONDS = 6 * 60 * 60
+
+
+def parse_playlist_lines(lines):
+    """
+    Parses JSON lines, one video per line, as printed by 'yt-dlp --print-json'.
+    Lines that aren't JSON objects are skipped.
+
+    Args:
+        lines (iterable): The JSON lines to parse.
+
+    Returns:
+        list: A list of dictionaries, each containing 'title' and 'duration' (in seconds).
+    """
+    videos_info = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                video_data = json_loads(line)
+                if not isinstance(video_data, dict):
+                    continue
+                title = video_data.get("title")
+                duration = video_data.get("duration")  # duration in seconds
+                if title and duration is not None:
+                    videos_info.append({"title": title, "duration": int(duration)})
+            except json.JSONDecodeError:
+                print(f"Warning: Could not decode JSON line: {line[:100]}...")
+    return videos_info
+
+
+def get_playlist_cache_path(playlist_url):
+    """
+    Returns the path of the cache file for a playlist URL.
+    """
+    cache_key = hashlib.sha1(playlist_url.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{cache_key}.ndjson")
+
+
+def load_cached_playlist_info(playlist_url):
+    """
+    Loads playlist information saved by a previous run, if it is still fresh.
+    A cache file that can't be read or parsed is treated as missing.
+
+    Args:
+        playlist_url (str): The URL of the YouTube playlist.
+
+    Returns:
+        list: The cached video information, or None if there is no usable cache.
+    """
+    cache_path = get_playlist_cache_path(playlist_url)
+    try:
+        if time.time() - os.path.getmtime(cache_path) > CACHE_TTL_SECONDS:
+            return None
+        videos_info = []
+        with open(cache_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                video_data = json_loads(line)
+                if not isinstance(video_data, dict):
+                    continue  # Not a record written by save_playlist_cache
+                title = video_data.get("title")
+                duration = video_data.get("duration")
+                if title and duration is not None:
+                    videos_info.append({"title": title, "duration": int(duration)})
+    except (OSError, ValueError, TypeError):
+        # An unreadable file, non-UTF-8 or corrupt JSON, or a malformed duration all
+        # count as a cache miss, so the playlist is simply fetched again
+        return None
+    print(f"Loaded information for {len(videos_info)} videos from cache: {cache_path}")
+    print("Use --refresh to fetch the playlist again.")
+    return videos_info
+
+
+def save_playlist_cache(playlist_url, videos_info):
+    """
+    Saves playlist information as JSON lines so later runs can skip yt-dlp.
+    Failing to write the cache only prints a warning.
+
+    Args:
+        playlist_url (str): The URL of the YouTube playlist.
+        videos_info (list): A list of dictionaries with 'title' and 'duration'.
+    """
+    cache_path = get_playlist_cache_path(playlist_url)
+    temp_path = cache_path + ".tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(video) + "\n" for video in videos_info))
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not write playlist cache: {e}")
+
+
+def get_youtube_playlist_info(playlist_url, refresh=False):
     """
     Fetches titles and durations for videos in a YouTube playlist using yt-dlp.
+    Results are cached for CACHE_TTL_SECONDS, so re-runs don't call yt-dlp again.
 
     Args:
         playlist_url (str): The URL of the YouTube playlist.
+        refresh (bool): Ignore any cached information and always call yt-dlp.
 
     Returns:
         list: A list of dictionaries, each containing 'title' and 'duration' (in seconds).
               Returns an empty list if there's an error or no videos found.
     """
+    if not refresh:
+        cached_videos_info = load_cached_playlist_info(playlist_url)
+        if cached_videos_info:
+            return cached_videos_info
+
     print(f"Fetching playlist information from: {playlist_url}")
     try:
         command = ["yt-dlp", "--flat-playlist", "--print-json", playlist_url]
-        process = subprocess.run(
-            command, capture_output=True, text=True, check=True, encoding="utf-8"
-        )
-
-        videos_info = []
-        for line in process.stdout.strip().split("\n"):
-            if line:
-                try:
-                    video_data = json.loads(line)
-                    title = video_data.get("title")
-                    duration = video_data.get("duration")  # duration in seconds
-                    if title and duration is not None:
-                        videos_info.append({"title": title, "duration": int(duration)})
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode JSON line: {line[:100]}...")
+        # Parse each JSON line as yt-dlp emits it instead of buffering the whole output
+        videos_info = parse_playlist_lines(iter_yt_dlp_output(command))
         print(f"Successfully fetched information for {len(videos_info)} videos.")
+        save_playlist_cache(playlist_url, videos_info)
         return videos_info
     except subprocess.CalledProcessError as e:
         print(f"Error calling yt-dlp: {e}")
@@ -58,11 +183,10 @@ def sanitize_filename_for_path(title):
     It retains descriptive phrases (e.g., '(Official Audio)') as they are part of Snaptube's filenames.
     """
     sanitized = title
-    # Replace common invalid characters with an underscore or remove them
+    # Replace common invalid characters with an underscore, collapsing them together
+    # with any neighbouring underscores into a single one.
     # Expanded to include ' and & based on user feedback
-    sanitized = re.sub(r'[\\/:*?"<>|\',&]', "_", sanitized)
-    # Replace multiple underscores with a single one
-    sanitized = re.sub(r"_+", "_", sanitized)
+    sanitized = _INVALID_FILENAME_CHARS_RE.sub("_", sanitized)
     # Remove leading/trailing spaces or underscores
     sanitized = sanitized.strip(" _")
     # Handle the leading underscore if present in the original title
@@ -80,20 +204,11 @@ def clean_display_title(title):
     """
     cleaned = title
 
-    # Remove common video/lyric/visualizer suffixes from the display title
+    # Remove common video/lyric/visualizer suffixes from the display title, as well
+    # as bitrate suffixes if they somehow made it into the YT title.
     # This regex is designed to remove these specific phrases from the end or middle
     # of the title, often enclosed in parentheses or brackets.
-    cleaned = re.sub(
-        r"\s*(\(|\[)(official\s+)?(video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie)(\)|\])\s*",
-        "",
-        cleaned,
-        flags=re.IGNORECASE | re.UNICODE,
-    )
-
-    # Remove common bitrate suffixes if they somehow made it into the YT title
-    cleaned = re.sub(
-        r"\s*\(mp3_\d+k\)\s*", "", cleaned, flags=re.IGNORECASE | re.UNICODE
-    )
+    cleaned = _DISPLAY_SUFFIX_RE.sub("", cleaned)
 
     # Clean up any remaining leading/trailing spaces or hyphens/underscores
     cleaned = cleaned.strip(" -_")
@@ -101,20 +216,73 @@ def clean_display_title(title):
     return cleaned
 
 
-def generate_m3u_playlist(playlist_info, output_file="chill_playlist.m3u"):
+def scan_local_download_folder(folder_path):
+    """
+    Scans a local copy of the Snaptube download folder once, so the M3U can point
+    at the files that actually exist instead of assuming the MP3 (160K) name.
+    Only files with an extension in AUDIO_EXTENSIONS are considered. When a song
+    exists in several formats, the one listed first in AUDIO_EXTENSIONS wins, and
+    the alphabetically first filename breaks any remaining tie.
+
+    Args:
+        folder_path (str): Path to the folder containing the downloaded songs.
+
+    Returns:
+        dict: A dictionary mapping filename bases (without the format suffix and
+              extension) to the actual filenames found in the folder.
+              Returns an empty dictionary if the folder can't be read.
+    """
+    extension_ranks = {
+        extension: rank for rank, extension in enumerate(AUDIO_EXTENSIONS)
+    }
+    # Filename base -> (extension rank, filename) of the best file found so far
+    best_files = {}
+    print(f"Scanning local download folder: {folder_path}")
+    try:
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                name, extension = os.path.splitext(entry.name)
+                rank = extension_ranks.get(extension.lower())
+                if rank is None or not entry.is_file():
+                    continue  # Skip sidecar files such as lyrics or cover art
+                filename_base = _FORMAT_SUFFIX_RE.sub("", name)
+                candidate = (rank, entry.name)
+                best = best_files.get(filename_base)
+                if best is None or candidate < best:
+                    best_files[filename_base] = candidate
+        local_files = {
+            filename_base: filename
+            for filename_base, (_, filename) in best_files.items()
+        }
+        print(f"Found {len(local_files)} audio files in the local download folder.")
+        return local_files
+    except FileNotFoundError:
+        print(f"Error: Folder not found at '{folder_path}'. Please check the path.")
+        return {}
+    except Exception as e:
+        print(f"An unexpected error occurred while scanning the local folder: {e}")
+        return {}
+
+
+def generate_m3u_playlist(
+    playlist_info, output_file="chill_playlist.m3u", local_files=None
+):
     """
     Generates an M3U playlist file based on YouTube video information.
-    It creates paths using the relative format and precise MP3 (160K) naming.
+    It creates paths using the relative format, with the actual filename for songs
+    found in local_files and precise MP3 (160K) naming for all others.
 
     Args:
         playlist_info (list): A list of dictionaries with 'title' and 'duration'.
         output_file (str): The name of the M3U file to create.
+        local_files (dict, optional): Filename bases mapped to actual filenames, as
+                                      returned by scan_local_download_folder. Songs
+                                      found there use the real filename instead of
+                                      the assumed MP3 (160K) one.
     """
-    # Base path for your Snaptube downloads, RELATIVE to /storage/emulated/0/
-    # This is based on Musicolet's exported paths.
-    RELATIVE_ANDROID_BASE_PATH = "snaptube/download/SnapTube Audio/"
-
-    m3u_content = ["#EXTM3U"]
+    if local_files is None:
+        local_files = {}
+    found_locally_count = 0
 
     print(f"\nGenerating M3U file: {output_file}")
     print("Musicolet will try to match these paths on your phone.")
@@ -122,45 +290,92 @@ def generate_m3u_playlist(playlist_info, output_file="chill_playlist.m3u"):
         f"IMPORTANT: Place '{output_file}' directly in '/storage/emulated/0/' on your phone."
     )
 
-    for video in playlist_info:
-        yt_title_original = video["title"]
-        duration = video["duration"]  # Duration in seconds
+    try:
+        # Write each entry as it is generated instead of joining the whole playlist
+        with open(output_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write("#EXTM3U")
 
-        # 1. Clean title for display in #EXTINF line
-        display_title = clean_display_title(yt_title_original)
+            for video in playlist_info:
+                yt_title_original = video["title"]
+                duration = video["duration"]  # Duration in seconds
 
-        # 2. Sanitize title for filename, keeping descriptive parts and fixing special chars
-        filename_base = sanitize_filename_for_path(yt_title_original)
+                # 1. Clean title for display in #EXTINF line
+                display_title = clean_display_title(yt_title_original)
 
-        # Generate ONLY the MP3 (160K) path as requested
-        filename = f"{filename_base}(MP3_160K).mp3"
+                # 2. Sanitize title for filename, keeping descriptive parts and fixing special chars
+                filename_base = sanitize_filename_for_path(yt_title_original)
 
-        # Add the EXTINF line with the cleaned display title
-        m3u_content.append(f"#EXTINF:{duration},{display_title}")
+                # Use the real filename if the folder scan found one, otherwise
+                # generate ONLY the MP3 (160K) path as requested
+                filename = local_files.get(filename_base)
+                if filename:
+                    found_locally_count += 1
+                else:
+                    filename = f"{filename_base}(MP3_160K).mp3"
 
-        # Construct the full relative Android path
-        full_android_path = os.path.join(RELATIVE_ANDROID_BASE_PATH, filename).replace(
-            "\\", "/"
-        )
-        m3u_content.append(full_android_path)
+                # Construct the full relative Android path
+                full_android_path = RELATIVE_ANDROID_BASE_PATH + filename
 
-        # Add an empty line for better readability in the M3U file (optional)
-        m3u_content.append("")
+                # Add the EXTINF line with the cleaned display title, the path and
+                # an empty line for better readability in the M3U file (optional)
+                f.write(
+                    f"\n#EXTINF:{duration},{display_title}\n{full_android_path}\n"
+                )
 
-    try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("\n".join(m3u_content))
         print(
             f"Successfully created '{output_file}' with {len(playlist_info)} entries."
         )
-        print(
-            "Each song now has a single, precise MP3 (160K) candidate path with relative addressing."
-        )
+        assumed_count = len(playlist_info) - found_locally_count
+        if not found_locally_count:
+            print(
+                "Each song now has a single, precise MP3 (160K) candidate path with relative addressing."
+            )
+        elif assumed_count:
+            print(
+                f"{assumed_count} songs use an assumed MP3 (160K) candidate path with relative addressing."
+            )
+        if local_files:
+            print(
+                f"{found_locally_count} paths use the actual filename found in the local download folder."
+            )
     except IOError as e:
         print(f"Error writing M3U file: {e}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate a Musicolet M3U playlist from a YouTube playlist."
+    )
+    parser.add_argument(
+        "--url",
+        action="append",
+        dest="urls",
+        metavar="URL",
+        help="YouTube playlist URL; repeat it to combine several playlists into one "
+        "M3U. Without it, the URL and the other settings are prompted for",
+    )
+    parser.add_argument(
+        "--output", help="M3U output filename (default: chill_playlist.m3u)"
+    )
+    parser.add_argument(
+        "--local-folder",
+        help="local copy of your Snaptube audio folder, used to pick actual filenames",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="ignore cached playlist information and fetch it again with yt-dlp",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="number of playlists fetched at the same time (default: 4)",
+    )
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
     print("--- YouTube Playlist to Musicolet M3U Generator ---")
     print("Make sure you have 'yt-dlp' installed on your system.")
     print("If not, install it via pip: pip install yt-dlp")
@@ -168,35 +383,58 @@ if __name__ == "__main__":
         "Or download the executable from: [https://github.com/yt-dlp/yt-dlp/releases](https://github.com/yt-dlp/yt-dlp/releases)"
     )
 
-    youtube_playlist_url = input(
-        "\nEnter the full URL of your YouTube playlist: "
-    ).strip()
-    if not youtube_playlist_url:
-        print("No URL provided. Exiting.")
-    else:
+    # Without --url the script runs interactively and prompts for anything not given
+    # on the command line; with it, omitted options fall back to their defaults so
+    # batch runs never block on input()
+    interactive = not args.urls
+    playlist_urls = args.urls
+    if interactive:
+        youtube_playlist_url = input(
+            "\nEnter the full URL of your YouTube playlist: "
+        ).strip()
+        if not youtube_playlist_url:
+            print("No URL provided. Exiting.")
+            exit()
+        playlist_urls = [youtube_playlist_url]
+
+    output_m3u_filename = args.output
+    if output_m3u_filename is None and interactive:
         output_m3u_filename = input(
             "Enter desired M3U output filename (e.g., chill_music.m3u, default: chill_playlist.m3u): "
         ).strip()
-        if not output_m3u_filename:
-            output_m3u_filename = "chill_playlist.m3u"
-
-        playlist_data = get_youtube_playlist_info(youtube_playlist_url)
-        if playlist_data:
-            generate_m3u_playlist(playlist_data, output_m3u_filename)
-            print("\n--- M3U Generation Complete ---")
-            print(f"1. Transfer '{output_m3u_filename}' to your Android phone.")
-            print(
-                f"   **IMPORTANT:** Place it directly in the root of your internal storage: `/storage/emulated/0/`"
-            )
-            print("2. Open Musicolet app on your phone.")
-            print("3. Go to 'Playlists' section.")
-            print(
-                "4. Look for an 'Import playlist' or '+' icon and select the transferred M3U file."
-            )
-            print(
-                "Musicolet will now scan your local files based on the paths in the M3U and create your playlist."
-            )
-        else:
-            print(
-                "\nCould not retrieve playlist information. M3U file was not generated."
-            )
+    if not output_m3u_filename:
+        output_m3u_filename = "chill_playlist.m3u"
+
+    local_folder_path = args.local_folder
+    if local_folder_path is None and interactive:
+        local_folder_path = input(
+            "Enter the path to a local copy of your Snaptube audio folder to use the actual filenames (optional, press Enter to skip): "
+        ).strip()
+    local_files = (
+        scan_local_download_folder(local_folder_path) if local_folder_path else {}
+    )
+
+    # yt-dlp runs in its own process, so threads are enough to overlap the fetches
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        playlists = executor.map(
+            partial(get_youtube_playlist_info, refresh=args.refresh), playlist_urls
+        )
+        playlist_data = [video for videos_info in playlists for video in videos_info]
+
+    if playlist_data:
+        generate_m3u_playlist(playlist_data, output_m3u_filename, local_files)
+        print("\n--- M3U Generation Complete ---")
+        print(f"1. Transfer '{output_m3u_filename}' to your Android phone.")
+        print(
+            f"   **IMPORTANT:** Place it directly in the root of your internal storage: `/storage/emulated/0/`"
+        )
+        print("2. Open Musicolet app on your phone.")
+        print("3. Go to 'Playlists' section.")
+        print(
+            "4. Look for an 'Import playlist' or '+' icon and select the transferred M3U file."
+        )
+        print(
+            "Musicolet will now scan your local files based on the paths in the M3U and create your playlist."
+        )
+    else:
+        print("\nCould not retrieve playlist information. M3U file was not generated.")
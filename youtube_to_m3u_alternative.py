@@ -1,7 +1,28 @@
+import logging
 import subprocess
-import json
-import os
 import re
+import sys
+from collections import defaultdict, namedtuple
+from functools import lru_cache
+
+from yt_dlp_runner import iter_yt_dlp_output
+
+log = logging.getLogger(__name__)
+
+# A playlist entry: the video title and its duration in seconds
+Video = namedtuple("Video", "title duration")
+
+# Patterns used by normalize_text_for_comparison, compiled once at import time.
+# The text is already lowercased, but IGNORECASE is kept on purpose: its Unicode
+# case folding lets suffixes spelled with e.g. "ı" or "ſ" match as well.
+_SUFFIX_RE = re.compile(
+    r"\s*[(\[](official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie|mp3_\d+k|m4a_\d+k|mp4_\d+k)[)\]]\s*",
+    re.IGNORECASE,
+)
+# Punctuation is mapped to spaces with str.translate, which needs no regex engine.
+_PUNCTUATION_TABLE = str.maketrans(
+    dict.fromkeys(".,!?;:'\"“”‘’`~@#$%^&*()_+={}[]\\|<>/", " ")
+)
 
 
 def get_youtube_playlist_info(playlist_url):
@@ -12,65 +33,71 @@ def get_youtube_playlist_info(playlist_url):
         playlist_url (str): The URL of the YouTube playlist.
 
     Returns:
-        list: A list of dictionaries, each containing 'title' and 'duration' (in seconds).
+        list: A list of Video tuples, each with a title and a duration (in seconds).
               Returns an empty list if there's an error or no videos found.
     """
-    print(f"Fetching playlist information from: {playlist_url}")
+    log.info("Fetching playlist information from: %s", playlist_url)
     try:
-        command = ["yt-dlp", "--flat-playlist", "--print-json", playlist_url]
-        process = subprocess.run(
-            command, capture_output=True, text=True, check=True, encoding="utf-8"
-        )
-
+        # Ask yt-dlp for just the two fields we use instead of a full JSON blob
+        # per video; a missing duration is printed as "NA". Unlike --print-json,
+        # --print writes titles unescaped, so force UTF-8 rather than the console
+        # encoding (e.g. cp1252 on Windows) to match how the output is decoded
+        command = [
+            "yt-dlp",
+            "--flat-playlist",
+            "--encoding",
+            "utf-8",
+            "--print",
+            "%(title)s\t%(duration)s",
+            playlist_url,
+        ]
         videos_info = []
-        for line in process.stdout.strip().split("\n"):
-            if line:
-                try:
-                    video_data = json.loads(line)
-                    title = video_data.get("title")
-                    duration = video_data.get("duration")  # duration in seconds
-                    if title and duration is not None:
-                        videos_info.append({"title": title, "duration": int(duration)})
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode JSON line: {line[:100]}...")
-        print(f"Successfully fetched information for {len(videos_info)} videos.")
+        # Parse each line as yt-dlp emits it instead of buffering the whole output
+        for line in iter_yt_dlp_output(command):
+            title, _, duration = line.rstrip("\n").rpartition("\t")
+            if not title or duration == "NA":
+                continue
+            try:
+                # Durations may be printed as floats, e.g. "213.0"
+                duration = int(float(duration))
+            except ValueError:
+                log.warning("Warning: Could not parse line: %s...", line[:100])
+                continue
+            videos_info.append(Video(title, duration))
+        log.info("Successfully fetched information for %d videos.", len(videos_info))
         return videos_info
     except subprocess.CalledProcessError as e:
-        print(f"Error calling yt-dlp: {e}")
-        print(f"Stderr: {e.stderr}")
-        print("Please ensure yt-dlp is installed and in your system's PATH.")
-        print("You can install it using pip: pip install yt-dlp")
+        log.error("Error calling yt-dlp: %s", e)
+        log.error("Stderr: %s", e.stderr)
+        log.error("Please ensure yt-dlp is installed and in your system's PATH.")
+        log.error("You can install it using pip: pip install yt-dlp")
         return []
     except FileNotFoundError:
-        print("Error: 'yt-dlp' command not found.")
-        print("Please ensure yt-dlp is installed and in your system's PATH.")
-        print("You can install it using pip: pip install yt-dlp")
+        log.error("Error: 'yt-dlp' command not found.")
+        log.error("Please ensure yt-dlp is installed and in your system's PATH.")
+        log.error("You can install it using pip: pip install yt-dlp")
         return []
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log.error("An unexpected error occurred: %s", e)
         return []
 
 
+@lru_cache(maxsize=None)
 def normalize_text_for_comparison(text):
     """
     Normalizes a string for robust comparison by:
     - Lowercasing
     - Removing common suffixes like (Official Video), (MP3_160K), etc.
     - Removing common punctuation and extra spaces.
+    Results are memoized, so duplicate titles and filenames are only normalized once.
     """
     normalized = text.lower()
 
     # Remove common YouTube/Snaptube suffixes and bitrate info
-    normalized = re.sub(
-        r"\s*(\(|\[)(official\s+)?(audio|video|lyrics?|visualizer|music\s+video|hd|hq|from\s+f1\s*®\s*the\s+movie|mp3_\d+k|m4a_\d+k|mp4_\d+k)(\)|\])\s*",
-        "",
-        normalized,
-        flags=re.IGNORECASE | re.UNICODE,
-    )
+    normalized = _SUFFIX_RE.sub("", normalized)
 
     # Remove common punctuation and replace with space, then reduce multiple spaces
-    normalized = re.sub(r'[.,!?;:\'"“”‘’`~@#$%^&*()_+={}\[\]\\|<>/]', " ", normalized)
-    normalized = re.sub(r"\s+", " ", normalized)
+    normalized = " ".join(normalized.translate(_PUNCTUATION_TABLE).split())
 
     # Remove leading/trailing spaces and hyphens
     normalized = normalized.strip(" -")
@@ -92,45 +119,33 @@ def parse_musicolet_m3u_for_local_files(m3u_file_path):
               Returns an empty dictionary if there's an error or no files found.
     """
     local_files_map = {}
-    print(f"Parsing local library M3U file: {m3u_file_path}")
+    log.info("Parsing local library M3U file: %s", m3u_file_path)
     try:
-        with open(m3u_file_path, "r", encoding="utf-8") as f:
-            current_path = None
+        with open(m3u_file_path, "r", encoding="utf-8", buffering=1 << 16) as f:
             for line in f:
                 line = line.strip()
-                if not line or line.startswith("#EXTM3U"):
-                    continue  # Skip empty lines and EXTM3U header
-
-                if line.startswith("#EXTINF:"):
-                    # This line contains duration and display title. The next line is the path.
-                    # We only care about the path for now, but parse EXTINF if needed later.
-                    continue
-                else:
-                    # This line should be the path to the song file
-                    current_path = line.replace("\\", "/")  # Normalize path separators
-
-                    if current_path:
-                        filename_with_ext = os.path.basename(current_path)
-                        normalized_filename = normalize_text_for_comparison(
-                            filename_with_ext
-                        )
-                        if (
-                            normalized_filename
-                            and normalized_filename not in local_files_map
-                        ):
-                            local_files_map[normalized_filename] = current_path
-                        current_path = None  # Reset for the next entry
-        print(
-            f"Extracted and normalized {len(local_files_map)} unique local file paths."
+                if not line or line[0] == "#":
+                    continue  # Skip empty lines and EXTM3U/EXTINF/comment lines
+
+                # Every other line is the path to a song file
+                path = line.replace("\\", "/")  # Normalize path separators
+                filename_with_ext = path.rpartition("/")[2]
+                normalized_filename = normalize_text_for_comparison(filename_with_ext)
+                if normalized_filename:
+                    # Keep only the first path for a given normalized name
+                    local_files_map.setdefault(normalized_filename, path)
+        log.info(
+            "Extracted and normalized %d unique local file paths.", len(local_files_map)
         )
         return local_files_map
     except FileNotFoundError:
-        print(
-            f"Error: Musicolet 'all songs' M3U file not found at '{m3u_file_path}'. Please check the path."
+        log.error(
+            "Error: Musicolet 'all songs' M3U file not found at '%s'. Please check the path.",
+            m3u_file_path,
         )
         return {}
     except Exception as e:
-        print(f"An unexpected error occurred while parsing local M3U: {e}")
+        log.error("An unexpected error occurred while parsing local M3U: %s", e)
         return {}
 
 
@@ -142,79 +157,125 @@ def generate_m3u_playlist_with_matching(
     them against local files using a forgiving algorithm. Only matched songs are included.
 
     Args:
-        youtube_playlist_info (list): A list of dictionaries with 'title' and 'duration'
+        youtube_playlist_info (list): A list of Video tuples (title, duration)
                                       from the YouTube playlist.
         local_files_map (dict): A dictionary mapping normalized local filenames to their
                                 original full paths.
         output_file (str): The name of the M3U file to create.
     """
-    m3u_content = ["#EXTM3U"]
     matched_songs_count = 0
 
-    print(f"\nGenerating M3U file: {output_file}")
-    print(
+    # Split every local filename into words once, not once per YouTube title, and
+    # index which filenames contain each word so a title is only scored against
+    # the filenames it shares at least one word with. Words are interned so the
+    # many repeats ("feat", "remix", ...) share one object and compare by identity
+    local_index = []
+    word_to_local_ids = defaultdict(list)
+    for local_id, (local_norm_filename, local_full_path) in enumerate(
+        local_files_map.items()
+    ):
+        local_words = set(map(sys.intern, local_norm_filename.split()))
+        # Keep the word count alongside the words for the length prefilter below
+        local_index.append((local_words, len(local_words), local_full_path))
+        for word in local_words:
+            word_to_local_ids[word].append(local_id)
+
+    log.info("\nGenerating M3U file: %s", output_file)
+    log.info(
         "This M3U will only contain paths for songs found on your device using a forgiving match."
     )
-    print(
-        f"IMPORTANT: Place '{output_file}' directly in '/storage/emulated/0/' on your phone."
+    log.info(
+        "IMPORTANT: Place '%s' directly in '/storage/emulated/0/' on your phone.",
+        output_file,
     )
-
-    for video in youtube_playlist_info:
-        yt_title_original = video["title"]
-        duration = video["duration"]  # Duration in seconds
-
-        normalized_yt_title = normalize_text_for_comparison(yt_title_original)
-        matched_local_path = None
-
-        # Try direct normalized match first
-        if normalized_yt_title in local_files_map:
-            matched_local_path = local_files_map[normalized_yt_title]
-        else:
-            # Try lenient word overlap match
-            yt_words = set(normalized_yt_title.split())
-            if yt_words:
-                best_match_score = 0
-                for local_norm_filename, local_full_path in local_files_map.items():
-                    local_words = set(local_norm_filename.split())
-                    if local_words:
-                        overlap_score = len(yt_words.intersection(local_words)) / len(
-                            yt_words
-                        )
-                        if (
-                            overlap_score >= 0.7 and overlap_score > best_match_score
-                        ):  # 70% word overlap threshold
-                            best_match_score = overlap_score
-                            matched_local_path = local_full_path
-                            # print(f"Lenient match for '{yt_title_original}' with '{os.path.basename(local_full_path)}' (Score: {overlap_score:.2f})")
-
-        if matched_local_path:
-            # Clean title for display in #EXTINF line (optional, but good practice)
-            display_title = yt_title_original  # Use original YT title for display, it's usually cleaner
-            # If you want to clean display title more aggressively like previous script:
-            # display_title = clean_display_title(yt_title_original)
-
-            m3u_content.append(f"#EXTINF:{duration},{display_title}")
-            m3u_content.append(matched_local_path)
-            m3u_content.append("")  # Empty line for readability
-            matched_songs_count += 1
-        # else:
-        # print(f"Skipping: No confident match found for '{yt_title_original}'")
+    # Checked once so the matching loop does no logging work unless debugging
+    debug_matches = log.isEnabledFor(logging.DEBUG)
 
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write("\n".join(m3u_content))
-        print(
-            f"Successfully created '{output_file}' with {matched_songs_count} matched songs."
+        # Write each matched entry as soon as it is found instead of collecting lines
+        with open(output_file, "w", encoding="utf-8", buffering=1 << 20) as f:
+            f.write("#EXTM3U")
+
+            for video in youtube_playlist_info:
+                yt_title_original = video.title
+                duration = video.duration  # Duration in seconds
+
+                normalized_yt_title = normalize_text_for_comparison(yt_title_original)
+                matched_local_path = None
+
+                # Try direct normalized match first
+                if normalized_yt_title in local_files_map:
+                    matched_local_path = local_files_map[normalized_yt_title]
+                else:
+                    # Try lenient word overlap match
+                    yt_words = set(map(sys.intern, normalized_yt_title.split()))
+                    yt_word_count = len(yt_words)
+                    if yt_words:
+                        candidate_ids = set()
+                        for word in yt_words:
+                            candidate_ids.update(word_to_local_ids.get(word, ()))
+
+                        # Shared words needed to reach the 70% threshold, i.e. ceil(0.7 * count)
+                        min_shared_words = -(-yt_word_count * 7 // 10)
+                        best_match_score = 0
+                        # Visit candidates in library order so ties still go to the first file
+                        for local_id in sorted(candidate_ids):
+                            local_words, local_word_count, local_full_path = (
+                                local_index[local_id]
+                            )
+                            if local_word_count < min_shared_words:
+                                continue  # Too few words to ever reach the threshold
+                            shared_words = len(yt_words & local_words)
+                            if shared_words < min_shared_words:
+                                continue  # Below the 70% word overlap threshold
+                            overlap_score = shared_words / yt_word_count
+                            if overlap_score > best_match_score:
+                                best_match_score = overlap_score
+                                matched_local_path = local_full_path
+                                if debug_matches:
+                                    log.debug(
+                                        "Lenient match for '%s' with '%s' (Score: %.2f)",
+                                        yt_title_original,
+                                        local_full_path.rpartition("/")[2],
+                                        overlap_score,
+                                    )
+                                if shared_words == yt_word_count:
+                                    break  # Every title word matched; no later file can beat it
+
+                if matched_local_path:
+                    # Clean title for display in #EXTINF line (optional, but good practice)
+                    display_title = yt_title_original  # Use original YT title for display, it's usually cleaner
+                    # If you want to clean display title more aggressively like previous script:
+                    # display_title = clean_display_title(yt_title_original)
+
+                    # EXTINF line, path and an empty line for readability
+                    f.write(
+                        f"\n#EXTINF:{duration},{display_title}\n{matched_local_path}\n"
+                    )
+                    matched_songs_count += 1
+                elif debug_matches:
+                    log.debug(
+                        "Skipping: No confident match found for '%s'", yt_title_original
+                    )
+
+        log.info(
+            "Successfully created '%s' with %d matched songs.",
+            output_file,
+            matched_songs_count,
         )
         if matched_songs_count < len(youtube_playlist_info):
-            print(
-                f"Note: {len(youtube_playlist_info) - matched_songs_count} songs from the YouTube playlist could not be confidently matched and were skipped."
+            log.info(
+                "Note: %d songs from the YouTube playlist could not be confidently matched and were skipped.",
+                len(youtube_playlist_info) - matched_songs_count,
             )
     except IOError as e:
-        print(f"Error writing M3U file: {e}")
+        log.error("Error writing M3U file: %s", e)
 
 
 if __name__ == "__main__":
+    # Status messages from the functions above go to stdout alongside the prompts
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
     print("--- YouTube Playlist to Musicolet M3U Generator (Forgiving Match) ---")
     print(
         "This script will create an M3U playlist for Musicolet by matching your YouTube songs"
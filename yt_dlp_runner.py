@@ -0,0 +1,38 @@
+import subprocess
+import tempfile
+
+
+def iter_yt_dlp_output(command):
+    """
+    Runs a yt-dlp command and yields its output lines as they are printed.
+
+    stderr is spooled to a temporary file rather than a pipe. yt-dlp can write a
+    lot to it (e.g. one warning per unavailable video), and a full stderr pipe
+    would block it while stdout is still being read, hanging both processes.
+
+    Args:
+        command (list): The yt-dlp command and its arguments.
+
+    Yields:
+        str: Each line yt-dlp prints to stdout, including the trailing newline.
+
+    Raises:
+        FileNotFoundError: If yt-dlp is not installed.
+        subprocess.CalledProcessError: If yt-dlp exits with a non-zero status.
+            Its stderr output is attached as the exception's stderr.
+    """
+    with tempfile.TemporaryFile() as stderr_file:
+        with subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file,
+            text=True,
+            encoding="utf-8",
+        ) as process:
+            yield from process.stdout
+        if process.returncode:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode("utf-8", errors="replace")
+            raise subprocess.CalledProcessError(
+                process.returncode, command, stderr=stderr
+            )